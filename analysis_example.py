@@ -14,16 +14,19 @@ Usage:
 """
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 
 from iz_client import IZClient, upload_and_analyze, get_analysis_results
 
-logging.basicConfig(level=logging.INFO)
-load_dotenv()
-
 
 def main():
+    # Configure only when run as a script, so importing this module doesn't
+    # re-read .env or reconfigure logging
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+
     parser = argparse.ArgumentParser(description='Upload an image to ImageZebra for analysis.')
     parser.add_argument(
         'image_path',
@@ -31,21 +34,38 @@ def main():
         default='images/low_res_GT_A.jpg',
         help='Path to the image file (default: images/low_res_GT_A.jpg)'
     )
+    parser.add_argument(
+        '--webhook-url',
+        help='Have the API deliver the result to this URL instead of polling for it'
+    )
     args = parser.parse_args()
 
     client = IZClient()
 
-    user_data = client.get('/user-data')
-    tier_name = user_data['tierName']
-    print(f'User is on the {tier_name} tier of service')
-    if tier_name and tier_name.lower() == 'platinum':
-        print('User has no restrictions on uploads as a platinum tier subscriber (API rate limits apply)')
-    else:
-        print(f'User has {user_data["analysisBalance"]} remaining uploads this billing period')
+    # The account lookup and the upload are independent, so issue them
+    # concurrently instead of paying a round-trip for each in sequence
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        user_data_future = executor.submit(client.get_cached, '/user-data')
+        upload_future = executor.submit(
+            upload_and_analyze, client, args.image_path, webhook_url=args.webhook_url
+        )
+
+        user_data = user_data_future.result()
+        tier_name = user_data['tierName']
+        print(f'User is on the {tier_name} tier of service')
+        if tier_name and tier_name.lower() == 'platinum':
+            print('User has no restrictions on uploads as a platinum tier subscriber (API rate limits apply)')
+        else:
+            print(f'User has {user_data["analysisBalance"]} remaining uploads this billing period')
 
-    upload_id = upload_and_analyze(client, args.image_path)
+        upload_id = upload_future.result()
 
-    get_analysis_results(client, upload_id)
+    if args.webhook_url:
+        # Webhook mode: no polling round-trips; the result arrives at the
+        # given URL when analysis completes
+        print(f'Analysis of upload {upload_id} will be delivered to {args.webhook_url}')
+    else:
+        get_analysis_results(client, upload_id)
 
 
 if __name__ == '__main__':
@@ -5,12 +5,26 @@ Provides authenticated access to the ImageZebra API, image upload via S3
 presigned URLs, and polling for analysis results.
 """
 import logging
+import mmap
 import os
+import random
+import re
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum
+from functools import cache
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from operator import itemgetter
 from pathlib import Path
-from time import sleep
+from time import monotonic, sleep
+from urllib.parse import urlsplit, urlunsplit
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import FileWrapper, MultipartEncoder
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +42,50 @@ class TargetType(StrEnum):
     REZ_CHECKER = "rez_checker"
 
 
+# Cheap membership probe for validating target-type strings in bulk; a
+# frozenset lookup avoids the enum-constructor machinery of TargetType(s)
+_TARGET_TYPE_VALUES = frozenset(t.value for t in TargetType)
+
+
+def is_valid_target_type(value: str) -> bool:
+    """Return True if `value` names a supported color target type."""
+    return value in _TARGET_TYPE_VALUES
+
+
+class _TunedAdapter(HTTPAdapter):
+    """HTTPAdapter with socket options tuned for uploads over long-haul links."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = [
+            # Don't delay small writes behind unacked data (Nagle); multipart
+            # bodies interleave small field segments with large file chunks
+            (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            # 1 MiB send buffer so a single stream can fill a high
+            # bandwidth-delay-product path to S3
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20),
+        ]
+        return super().init_poolmanager(*args, **kwargs)
+
+
+@cache
+def _shared_session() -> requests.Session:
+    """Process-wide session shared by all IZClient instances.
+
+    requests.Session is thread-safe for requests, so applications that
+    construct several clients (multitenant callers, worker pools) share one
+    warm connection pool instead of re-handshaking per client. Auth is kept
+    per-instance on the clients, never on this session.
+    """
+    session = requests.Session()
+    session.mount('https://', _TunedAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    ))
+    return session
+
+
 class IZClient:
     """Authenticated client for the ImageZebra API."""
 
@@ -41,39 +99,90 @@ class IZClient:
         application_key = application_key or os.getenv('IMAGEZEBRA_APPLICATION_KEY')
         username = username or os.getenv('IMAGEZEBRA_USERNAME')
         password = password or os.getenv('IMAGEZEBRA_PASSWORD')
-        response = requests.post(
+        # Shared session: keeps warm TCP+TLS connections alive across calls
+        # (and across client instances) instead of paying a fresh handshake
+        # per request
+        self._session = _shared_session()
+        response = self._session.post(
             f'{BASE_URL}/token',
             json={'username': username, 'password': password},
             headers={'X-Application-Key': application_key},
         )
         response.raise_for_status()
-        self.token = response.json()['token']
+        self.token = orjson.loads(response.content)['token']
+        # Per-instance, since the session is shared between clients
         self._auth_headers = {
             'Authorization': f'Bearer {self.token}',
             'X-Application-Key': application_key,
         }
+        # Small TTL cache for idempotent reads; (path, params) -> (expiry, value)
+        self._get_cache = {}
+        self._compression_checked = False
 
     def _request(self, method: str, path: str, **kwargs):
         """Make an authenticated request to the API."""
-        headers = {**self._auth_headers, **kwargs.pop('headers', {})}
-        response = requests.request(method, f'{BASE_URL}{path}', headers=headers, **kwargs)
+        headers = kwargs.pop('headers', None)
+        # Only build a merged dict on the rare calls that override headers
+        headers = {**self._auth_headers, **headers} if headers else self._auth_headers
+        response = self._session.request(method, f'{BASE_URL}{path}', headers=headers, **kwargs)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             # Attach response body to exception for caller inspection (often contains
             # validation errors or status messages from the API)
             try:
-                e.response_content = response.json()
-            except requests.exceptions.JSONDecodeError:
+                e.response_content = orjson.loads(response.content)
+            except orjson.JSONDecodeError:
                 e.response_content = {}
+            finally:
+                # Reading .content drained the body; closing returns the
+                # connection to the pool so the polling loop doesn't leak
+                # connections and pay fresh TLS handshakes
+                response.close()
             raise
+        if not self._compression_checked and path.startswith('/upload-results-summary/'):
+            # One-time sanity check that the largest response we fetch is
+            # compressed on the wire; requests advertises br alongside gzip
+            # when the brotli package is installed and decompresses either
+            self._compression_checked = True
+            if response.headers.get('Content-Encoding') not in ('br', 'gzip'):
+                logger.warning('Analysis summary was served uncompressed; server-side compression would reduce transfer size')
+        if method in ('POST', 'DELETE'):
+            # A write may stale any cached read under the same path
+            self._get_cache = {k: v for k, v in self._get_cache.items() if not path.startswith(k[0])}
         if response.status_code == 204:
+            response.close()
             return None
-        return response.json()
+        return orjson.loads(response.content)
 
     def get(self, path: str, **kwargs):
         return self._request('GET', path, **kwargs)
 
+    def get_cached(self, path: str, ttl: float = 60, **kwargs):
+        """GET with a small in-process TTL cache.
+
+        Use for idempotent reads like /user-data and /targets that scripts
+        tend to re-fetch; entries expire after `ttl` seconds and are dropped
+        when a POST or DELETE touches the same path.
+        """
+        key = (path, tuple(sorted(kwargs.get('params', {}).items())))
+        cached = self._get_cache.get(key)
+        if cached and cached[0] > monotonic():
+            return cached[1]
+        value = self.get(path, **kwargs)
+        self._get_cache[key] = (monotonic() + ttl, value)
+        return value
+
+    def head(self, path: str, **kwargs):
+        """Make an authenticated HEAD request, returning the raw response.
+
+        HEAD responses have no body, so the caller inspects status code and
+        headers rather than parsed JSON.
+        """
+        headers = kwargs.pop('headers', None)
+        headers = {**self._auth_headers, **headers} if headers else self._auth_headers
+        return self._session.head(f'{BASE_URL}{path}', headers=headers, **kwargs)
+
     def post(self, path: str, **kwargs):
         return self._request('POST', path, **kwargs)
 
@@ -81,62 +190,238 @@ class IZClient:
         return self._request('DELETE', path, **kwargs)
 
 
-def upload_and_analyze(client: IZClient, image_path: str, target_id: str = None) -> str:
+def _accelerated_url(url: str) -> str:
+    """Rewrite a standard S3 bucket endpoint to the Transfer Acceleration one.
+
+    Accelerated uploads enter AWS at the nearest edge location and traverse
+    the AWS backbone to the bucket region, which improves throughput for
+    users far from the bucket. Returns the URL unchanged if it doesn't look
+    like a virtual-hosted S3 endpoint.
+    """
+    parts = urlsplit(url)
+    match = re.fullmatch(r'(?P<bucket>[a-z0-9-]+)\.s3(?:[.-][a-z0-9-]+)?\.amazonaws\.com', parts.netloc)
+    if not match:
+        return url
+    return urlunsplit(parts._replace(netloc=f'{match["bucket"]}.s3-accelerate.amazonaws.com'))
+
+
+# Default part size for multipart uploads; S3 requires parts >= 5 MiB
+PART_SIZE = 8 * 1024 * 1024
+
+
+def _upload_image_multipart(client: IZClient, image_path: str, presigned_url_response: dict) -> None:
+    """Upload a large image as parallel parts to presigned PUT URLs.
+
+    Used when the presign response includes `partUrls` (one presigned PUT URL
+    per part) and a `completePath` to POST the collected part ETags to.
+    Parallel part uploads achieve much higher aggregate throughput to S3 than
+    a single stream. Parts are read with os.pread so worker threads can share
+    one file descriptor without seeking.
+    """
+    part_urls = presigned_url_response['partUrls']
+    part_size = presigned_url_response.get('partSize', PART_SIZE)
+    fd = os.open(image_path, os.O_RDONLY)
+    try:
+        def put_part(part):
+            index, url = part
+            data = os.pread(fd, part_size, index * part_size)
+            # No auth headers: the presigned URL carries S3's own credentials
+            response = client._session.put(url, data=data)
+            response.raise_for_status()
+            return response.headers.get('ETag')
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            etags = list(executor.map(put_part, enumerate(part_urls)))
+    finally:
+        os.close(fd)
+    client.post(presigned_url_response['completePath'], json={
+        'parts': [{'partNumber': i + 1, 'etag': etag} for i, etag in enumerate(etags)],
+    })
+    logger.info(f'Multipart upload of {len(etags)} part(s) successful!')
+
+
+def _upload_image(client: IZClient, image_path: str, presigned_url_response: dict) -> None:
+    """Upload an image to S3 using a presigned POST response."""
+    if presigned_url_response.get('partUrls'):
+        # The API presigned this upload for S3 multipart; upload parts in
+        # parallel instead of one POST stream
+        _upload_image_multipart(client, image_path, presigned_url_response)
+        return
+    filename = Path(image_path).name
+    url = presigned_url_response['url']
+    if presigned_url_response.get('accelerate'):
+        # The bucket has S3 Transfer Acceleration enabled and the URL was
+        # signed for it; route the upload through the accelerate endpoint
+        url = _accelerated_url(url)
+    # Stream the multipart body straight from a memory-mapped view of the
+    # file instead of buffering it all in memory: the kernel serves pages
+    # from the page cache with its own readahead, avoiding per-chunk read()
+    # syscalls during the upload
+    with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        fields = [(e['key'], e['value']) for e in presigned_url_response['fields']]
+        # File must be the last field in the multipart form. The FileWrapper
+        # gives the mmap the shrinking length the encoder needs to know when
+        # the body is fully sent
+        fields.append(('file', (filename, FileWrapper(mm), 'image/jpeg')))
+        encoder = MultipartEncoder(fields=fields)
+        upload_response = client._session.post(
+            url,
+            data=encoder,
+            # No API auth headers for S3: the presigned POST carries its own
+            # credentials in the form fields
+            headers={'Content-Type': encoder.content_type},
+        )
+        upload_response.raise_for_status()
+        logger.info(f'Upload successful!')
+
+
+def _request_analysis(client: IZClient, upload_id: str, target_id: str = None, webhook_url: str = None) -> None:
+    """Request analysis of an uploaded image."""
+    logger.info('Requesting analysis')
+    params = {'target_id': target_id} if target_id else {}
+    if webhook_url:
+        params['webhook_url'] = webhook_url
+    client.post(f'/requests-for-analysis/{upload_id}', params=params)
+
+
+def upload_and_analyze(client: IZClient, image_path: str, target_id: str = None, webhook_url: str = None) -> str:
     """
     Upload an image and request analysis.
 
     Args:
         target_id: Optional target library ID. If omitted, the target type is
                    auto-detected from the image.
+        webhook_url: Optional callback URL. If given, the API delivers the
+                     analysis result there instead of the caller polling;
+                     see wait_for_webhook().
 
     Returns the upload ID for use with get_analysis_results().
     """
     filename = Path(image_path).name
     presigned_url_response = client.get(f'/presigned-urls/{filename}')
+    _upload_image(client, image_path, presigned_url_response)
+    _request_analysis(client, presigned_url_response['uploadId'], target_id, webhook_url)
+    return presigned_url_response['uploadId']
 
-    # Upload image to S3 using presigned POST
-    fields = presigned_url_response['fields']
-    # Map field names to S3 expected format
-    form_data = {e['key']: e['value'] for e in fields}
-
-    with open(image_path, 'rb') as f:
-        # File must be the last field in the multipart form
-        files = {'file': (filename, f, 'image/jpeg')}
-        upload_response = requests.post(
-            presigned_url_response['url'],
-            data=form_data,
-            files=files
-        )
-        upload_response.raise_for_status()
-        logger.info(f'Upload successful!')
 
-    logger.info('Requesting analysis')
-    params = {'target_id': target_id} if target_id else {}
-    client.post(f'/requests-for-analysis/{presigned_url_response["uploadId"]}', params=params)
-    return presigned_url_response['uploadId']
+def wait_for_webhook(port: int, timeout: float = 600) -> dict:
+    """
+    Block until an analysis-complete callback arrives on a local port.
 
+    Zero-polling alternative to get_analysis_results: pass a webhook_url
+    pointing at this host to upload_and_analyze, then call this to serve a
+    single POST and return its parsed JSON payload. The URL must be
+    reachable from the ImageZebra servers, so this only works on hosts with
+    a public address or a tunnel.
+    """
+    received = {}
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            received['payload'] = orjson.loads(self.rfile.read(length)) if length else {}
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    with HTTPServer(('', port), _Handler) as server:
+        server.timeout = timeout
+        server.handle_request()
+    if 'payload' not in received:
+        raise TimeoutError(f'No webhook callback received within {timeout}s')
+    return received['payload']
+
+
+def upload_and_analyze_batch(client: IZClient, image_paths: list[str], target_id: str = None) -> list[str]:
+    """
+    Upload several images in sequence, prefetching presigned URLs.
+
+    The presigned URL for image N+1 is requested on a worker thread while
+    image N is still uploading, so each iteration after the first starts its
+    S3 upload without waiting on a presign round-trip.
 
-def get_analysis_results(client: IZClient, upload_id: str) -> None:
-    """Poll for analysis completion and print the results summary."""
+    Returns the upload IDs in input order.
+    """
+    upload_ids = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        next_presign = None
+        for i, image_path in enumerate(image_paths):
+            if next_presign is None:
+                next_presign = executor.submit(client.get, f'/presigned-urls/{Path(image_path).name}')
+            presigned_url_response = next_presign.result()
+            next_presign = None
+            if i + 1 < len(image_paths):
+                next_filename = Path(image_paths[i + 1]).name
+                next_presign = executor.submit(client.get, f'/presigned-urls/{next_filename}')
+            _upload_image(client, image_path, presigned_url_response)
+            _request_analysis(client, presigned_url_response['uploadId'], target_id)
+            upload_ids.append(presigned_url_response['uploadId'])
+    return upload_ids
+
+
+def get_analysis_results(client: IZClient, upload_id: str, timeout: float = 600) -> None:
+    """Poll for analysis completion and print the results summary.
+
+    Polls with exponential backoff and jitter: short analyses are picked up
+    quickly while long ones don't hammer the API with fixed-interval retries.
+    """
+    delay, max_delay, rate = 0.5, 15.0, 1.5
+    deadline = monotonic() + timeout
+    use_head = True
     while True:
+        pending = False
+        probed_done = False
         try:
-            logger.info('Requesting summary')
-            response = client.get(f'/upload-results-summary/{upload_id}')
-            break
+            if use_head:
+                # Cheap probe: only status + headers cross the wire, not the
+                # full summary JSON, while analysis is still in progress
+                probe = client.head(f'/upload-results-summary/{upload_id}')
+                if probe.status_code == 202 or probe.headers.get('X-Analysis-Status') == 'pending':
+                    pending = True
+                elif not probe.ok:
+                    # The endpoint rejects HEAD (405) or answers errors
+                    # without the pending signal; a bodiless error can't be
+                    # told apart from "not complete", so stop probing and
+                    # fall back to plain GETs
+                    use_head = False
+                else:
+                    probed_done = True
+            if not pending:
+                logger.info('Requesting summary')
+                response = client.get(f'/upload-results-summary/{upload_id}')
+                break
         except requests.exceptions.HTTPError as e:
             if e.response_content.get('error') != 'Image analysis not complete':
                 raise
-            logger.info('Image analysis not complete')
-            sleep(5)
-
-    print(f'\nAnalysis for {response["filePath"]}')
-    print('*' * 80)
-    print(f'Passing quality thresholds: {response["passing"]}')
-    print(f'Reference values used: {response["referenceValuesUsed"]}')
-    print(f'Specification used: {response["spec"]}')
-    print(f'Target type: {response["targetType"]}')
+            if probed_done:
+                # HEAD claimed the summary was ready but the GET disagrees;
+                # the probe isn't trustworthy here, stop doubling requests
+                use_head = False
+            pending = True
+        if monotonic() >= deadline:
+            raise TimeoutError(f'Analysis of upload {upload_id} did not complete within {timeout}s')
+        logger.info('Image analysis not complete')
+        sleep(random.uniform(0, delay))
+        delay = min(max_delay, delay * rate)
 
+    # Buffer the report and write it in one call rather than a locked and
+    # flushed print() per metric
+    lines = [
+        f'\nAnalysis for {response["filePath"]}',
+        '*' * 80,
+        f'Passing quality thresholds: {response["passing"]}',
+        f'Reference values used: {response["referenceValuesUsed"]}',
+        f'Specification used: {response["spec"]}',
+        f'Target type: {response["targetType"]}',
+    ]
+    # itemgetter pulls all three fields per metric in one C-level call
+    metric_fields = itemgetter('name', 'stars', 'isPassing')
     for metric_group in response['metricGroups']:
-        print(f'\n{metric_group["name"]}\n{"-" * 80}')
-        for metric in metric_group['metrics']:
-            print(f'{metric["name"]:40}{metric["stars"]} stars, passing: {metric["isPassing"]}')
+        lines.append(f'\n{metric_group["name"]}\n{"-" * 80}')
+        lines.extend(
+            f'{name:40}{stars} stars, passing: {passing}'
+            for name, stars, passing in map(metric_fields, metric_group['metrics'])
+        )
+    sys.stdout.write('\n'.join(lines) + '\n')
@@ -0,0 +1,202 @@
+"""
+Async ImageZebra API client for batch workloads.
+
+Mirrors IZClient and upload_and_analyze from iz_client.py, but built on
+httpx.AsyncClient so many uploads proceed concurrently over a shared HTTP/2
+connection pool instead of serializing one upload's round-trips after
+another's. The sync client in iz_client.py remains the simpler choice for
+single-image scripts.
+"""
+import asyncio
+import logging
+import os
+import secrets
+from pathlib import Path
+
+import aiofiles
+import httpx
+
+from iz_client import BASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Cap on simultaneous in-flight uploads in upload_and_analyze_many
+MAX_CONCURRENT_UPLOADS = 8
+
+# Read size for streaming file bodies; also the per-upload resident memory
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncIZClient:
+    """Authenticated async client for the ImageZebra API.
+
+    Use as an async context manager:
+
+        async with AsyncIZClient() as client:
+            upload_ids = await upload_and_analyze_many(client, paths)
+    """
+
+    def __init__(
+        self,
+        application_key: str = None,
+        username: str = None,
+        password: str = None,
+    ):
+        self._application_key = application_key or os.getenv('IMAGEZEBRA_APPLICATION_KEY')
+        self._username = username or os.getenv('IMAGEZEBRA_USERNAME')
+        self._password = password or os.getenv('IMAGEZEBRA_PASSWORD')
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        )
+        self.token = None
+        self._auth_headers = {}
+
+    async def authenticate(self):
+        """Exchange credentials for a bearer token."""
+        response = await self._client.post(
+            f'{BASE_URL}/token',
+            json={'username': self._username, 'password': self._password},
+            headers={'X-Application-Key': self._application_key},
+        )
+        response.raise_for_status()
+        self.token = response.json()['token']
+        # Kept per-call rather than on the client so S3 uploads through the
+        # same connection pool don't carry the API auth headers
+        self._auth_headers = {
+            'Authorization': f'Bearer {self.token}',
+            'X-Application-Key': self._application_key,
+        }
+        return self
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return await self.authenticate()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs):
+        """Make an authenticated request to the API."""
+        headers = {**self._auth_headers, **kwargs.pop('headers', {})}
+        response = await self._client.request(method, f'{BASE_URL}{path}', headers=headers, **kwargs)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            # Attach response body to exception for caller inspection, as in
+            # the sync client
+            try:
+                e.response_content = response.json()
+            except ValueError:
+                e.response_content = {}
+            raise
+        if response.status_code == 204:
+            return None
+        return response.json()
+
+    async def get(self, path: str, **kwargs):
+        return await self._request('GET', path, **kwargs)
+
+    async def post(self, path: str, **kwargs):
+        return await self._request('POST', path, **kwargs)
+
+    async def delete(self, path: str, **kwargs):
+        return await self._request('DELETE', path, **kwargs)
+
+
+def _multipart_framing(boundary: str, form_data: dict, filename: str) -> tuple[list[bytes], bytes]:
+    """Build the fixed framing of a multipart/form-data body.
+
+    Returns the encoded form-field sections plus the file part's header, and
+    the closing boundary. Separate from the stream itself so the exact body
+    size can be computed before any bytes are sent.
+    """
+    head = [
+        (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+            f'{value}\r\n'
+        ).encode()
+        for key, value in form_data.items()
+    ]
+    # File must be the last field in the multipart form
+    head.append((
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode())
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    return head, tail
+
+
+async def _multipart_stream(head: list[bytes], tail: bytes, f):
+    """Yield a multipart/form-data body, streaming the file in chunks.
+
+    Built by hand because httpx's files= buffers the whole payload; this
+    keeps per-upload memory at O(UPLOAD_CHUNK_SIZE) regardless of image
+    size, which matters with MAX_CONCURRENT_UPLOADS bodies in flight.
+    """
+    for piece in head:
+        yield piece
+    while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+    yield tail
+
+
+async def upload_and_analyze(client: AsyncIZClient, image_path: str, target_id: str = None) -> str:
+    """
+    Upload an image and request analysis.
+
+    Async counterpart of iz_client.upload_and_analyze; the file streams
+    through aiofiles in UPLOAD_CHUNK_SIZE chunks, so neither the event loop
+    nor memory is held hostage by large images.
+
+    Returns the upload ID.
+    """
+    filename = Path(image_path).name
+    presigned_url_response = await client.get(f'/presigned-urls/{filename}')
+
+    form_data = {e['key']: e['value'] for e in presigned_url_response['fields']}
+    boundary = secrets.token_hex(16)
+    head, tail = _multipart_framing(boundary, form_data, filename)
+    # S3 rejects chunked transfer encoding on presigned uploads, so declare
+    # the exact body size up front; httpx then streams without chunking
+    content_length = sum(map(len, head)) + os.stat(image_path).st_size + len(tail)
+    async with aiofiles.open(image_path, 'rb') as f:
+        upload_response = await client._client.post(
+            presigned_url_response['url'],
+            content=_multipart_stream(head, tail, f),
+            headers={
+                'Content-Type': f'multipart/form-data; boundary={boundary}',
+                'Content-Length': str(content_length),
+            },
+        )
+    upload_response.raise_for_status()
+    logger.info(f'Upload of {filename} successful!')
+
+    logger.info('Requesting analysis')
+    params = {'target_id': target_id} if target_id else {}
+    await client.post(f'/requests-for-analysis/{presigned_url_response["uploadId"]}', params=params)
+    return presigned_url_response['uploadId']
+
+
+async def upload_and_analyze_many(
+    client: AsyncIZClient,
+    image_paths: list[str],
+    target_id: str = None,
+) -> list[str]:
+    """
+    Upload a batch of images concurrently and request analysis for each.
+
+    Uploads overlap on the shared connection pool, bounded by
+    MAX_CONCURRENT_UPLOADS. Returns the upload IDs in input order.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+    async def upload_one(path):
+        async with semaphore:
+            return await upload_and_analyze(client, path, target_id=target_id)
+
+    return list(await asyncio.gather(*(upload_one(p) for p in image_paths)))
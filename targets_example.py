@@ -20,23 +20,17 @@ from dotenv import load_dotenv
 
 from iz_client import IZClient, TargetType, upload_and_analyze, get_analysis_results
 
-logging.basicConfig(level=logging.INFO)
-load_dotenv()
-
 TARGET_NAME = 'Example Golden Thread'
 TARGET_TYPE = TargetType.GOLDEN_THREAD_DEVICE_LEVEL
 REFERENCE_DATA_SOURCE = 'target_type_defaults'
 
 
-def find_matching_target(targets, name):
-    """Find an existing target that matches by name."""
-    for target in targets:
-        if target['name'] == name:
-            return target
-    return None
-
-
 def main():
+    # Configure only when run as a script, so importing this module doesn't
+    # re-read .env or reconfigure logging
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+
     parser = argparse.ArgumentParser(description='Demonstrate target library and target-based analysis.')
     parser.add_argument(
         'image_path',
@@ -49,15 +43,17 @@ def main():
     client = IZClient()
 
     # List all targets in the library
-    response = client.get('/targets')
+    response = client.get_cached('/targets')
     targets = response['targets']
     print(f'Found {len(targets)} existing target(s) in library:')
     for t in targets:
         print(f'  - {t["name"]} (type: {t["targetType"]}, id: {t["id"]})')
 
-    # Check whether a matching target already exists
+    # Check whether a matching target already exists; index by name once so
+    # lookups stay O(1) even for large target libraries
     created = False
-    existing = find_matching_target(targets, TARGET_NAME)
+    by_name = {t['name']: t for t in targets}
+    existing = by_name.get(TARGET_NAME)
     if existing:
         target = existing
         print(f'\nUsing existing target: {target["name"]} (id: {target["id"]})')